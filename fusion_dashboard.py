@@ -1,12 +1,15 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import json
+import ast
+import pathlib
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure Streamlit page
 st.set_page_config(
@@ -15,42 +18,287 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Cache functions for performance
-@st.cache_data(ttl=3600)  # Cache for 1 hour
+# Row limits that keep chart axes readable and table payloads small
+FUNDING_CHART_TOP_N = 30
+TABLE_TOP_N = 50
+
+# Upper bound on cached figures and counts per helper, one per filter selection
+CHART_CACHE_ENTRIES = 32
+
+# How long loaded API data stays fresh, in seconds
+CACHE_TTL = 3600
+
+# How long a failed load serves the saved payload before the API is retried, in seconds
+FALLBACK_RETRY_INTERVAL = 60
+
+# Shared HTTP session so repeated API loads reuse keep-alive connections.
+# Held as a resource because Streamlit re-executes this module on every rerun.
+@st.cache_resource
+def _get_session():
+    """Pooled HTTP session with retries for the API endpoint"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+    )
+    session.mount("https://", adapter)
+    # Ask for compressed JSON; requests decodes it transparently
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "Accept": "application/json"})
+    return session
+
+def _fetch_api_payload(api_url):
+    """Fetch the raw JSON bytes from the API endpoint"""
+    response = _get_session().get(api_url, timeout=(5, 30))  # (connect, read)
+    response.raise_for_status()  # Raise an exception for bad status codes
+    return response.content
+
+@st.cache_resource
+def _prefetch_slot(api_url):
+    """Process-wide holder for the startup prefetch of an API URL"""
+    return {'lock': threading.Lock(), 'started': False, 'future': None}
+
+def _start_prefetch(api_url):
+    """Start fetching the API payload on a background thread, once per process"""
+    slot = _prefetch_slot(api_url)
+    with slot['lock']:
+        if slot['started']:
+            return
+        slot['started'] = True
+        executor = ThreadPoolExecutor(max_workers=1)
+        slot['future'] = executor.submit(_fetch_api_payload, api_url)
+        executor.shutdown(wait=False)
+
+def _take_prefetched_payload(api_url):
+    """Hand over the prefetched payload once, or None if there is no prefetch"""
+    slot = _prefetch_slot(api_url)
+    with slot['lock']:
+        future, slot['future'] = slot['future'], None
+    if future is None:
+        return None
+    # A failed prefetch re-raises here instead of retrying the request
+    return future.result()
+
+# Last successful API payload, served when the API is unreachable
+PAYLOAD_CACHE_PATH = pathlib.Path(".cache/fusion_companies.json")
+
+def _companies_to_df(content):
+    """Parse the API JSON bytes into a flat companies DataFrame"""
+    data = orjson.loads(content)
+    
+    # Flatten only the nested fields the dashboard uses
+    rows = [
+        {
+            **company,
+            'funding.amount': (company.get('funding') or {}).get('amount'),
+            'commercial_output.mwe': (company.get('commercial_output') or {}).get('mwe')
+        }
+        for company in data['companies']
+    ]
+    df = pd.DataFrame(rows)
+    return df.drop(columns=['funding', 'commercial_output'], errors='ignore')
+
+# Cache functions for performance. Errors propagate so failures are not cached;
+# load_companies() reports them and serves the on-disk fallback.
+@st.cache_data(ttl=CACHE_TTL)  # Cache for 1 hour
 def load_data_from_api(api_url):
-    """Load JSON data from API endpoint"""
+    """Load the raw JSON payload from API endpoint"""
+    # The startup prefetch serves the first load only; later refreshes fetch directly.
+    # Fetch errors from either path propagate to load_companies().
+    content = _take_prefetched_payload(api_url)
+    if content is None:
+        content = _fetch_api_payload(api_url)
+    return content
+
+def _parse_milestones(milestones):
+    """Turn a milestones value into a list, tolerating plain or malformed strings"""
+    if isinstance(milestones, list):
+        return milestones
+    if not isinstance(milestones, str):
+        return []
     try:
-        # Make GET request to API
-        response = requests.get(api_url, timeout=30)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        
-        # Parse JSON
-        data = response.json()
-        return pd.json_normalize(data['companies'])
+        parsed = ast.literal_eval(milestones)
+    except (ValueError, SyntaxError):
+        return [milestones]
+    return parsed if isinstance(parsed, list) else [parsed]
+
+# Held as a shared resource so reruns reuse the frame without hashing or copying it;
+# callers must treat the returned DataFrame as read-only
+@st.cache_resource(ttl=CACHE_TTL)
+def load_prepared(api_url):
+    """Load the API data and derive typed and pre-parsed columns and filter options"""
+    content = load_data_from_api(api_url)
     
+    # Parse JSON straight from the response bytes
+    prepared = _prepare_companies(_companies_to_df(content))
+    
+    # Keep a copy on disk as a fallback for API outages, but only once the
+    # payload has been fully prepared so a bad response never replaces a good one
+    if not prepared[0].empty:
+        try:
+            PAYLOAD_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            PAYLOAD_CACHE_PATH.write_bytes(content)
+        except OSError:
+            pass
+    
+    return prepared
+
+def _prepare_companies(raw_df):
+    """Derive typed and pre-parsed columns and filter options from raw company data"""
+    if raw_df.empty:
+        return raw_df, None
+    
+    # Index by company name for direct lookups; keep the column for display
+    df = raw_df.set_index('name', drop=False).rename_axis(None)
+    
+    # Categoricals make the sidebar filters and value counts cheaper. Missing values
+    # get an explicit label so they stay selectable, and categories keep first-seen order.
+    for column in ('fuel_source', 'general_approach'):
+        values = df[column].fillna('Unknown')
+        df[column] = pd.Categorical(values, categories=values.unique())
+    
+    # Founding year as a number instead of slicing the date string on every render
+    df['founded_year'] = pd.to_numeric(df['year_founded'].str.slice(0, 4), errors='coerce').astype('Int16')
+    
+    # Milestones may arrive as a stringified list; parse them once here
+    df['milestones_past_12_months'] = df['milestones_past_12_months'].map(_parse_milestones)
+    
+    # Lowercased copies for the case-insensitive search in the data tab
+    df['_name_lc'] = df['name'].fillna('').str.lower()
+    df['_desc_lc'] = df['description'].fillna('').str.lower()
+    
+    # Display strings for the data tab, formatted once instead of per rerun
+    df['funding_display'] = "$" + (df['funding.amount'] / 1e6).round(1).astype(str) + "M"
+    df['founded_display'] = df['year_founded'].str.slice(0, 4)
+    
+    # Filter options computed once per dataset rather than on every rerun
+    meta = {
+        'fuel_sources': df['fuel_source'].cat.categories.tolist(),
+        'approaches': df['general_approach'].cat.categories.tolist()
+    }
+    return df, meta
+
+# Held briefly so that during an outage reruns reuse the fallback instead of
+# blocking on the API; it is retried once this expires
+@st.cache_resource(ttl=FALLBACK_RETRY_INTERVAL)
+def _load_prepared_or_fallback(api_url):
+    """Prepared company data and None, or the saved payload and the load error"""
+    try:
+        return load_prepared(api_url), None
     except requests.exceptions.RequestException as e:
-        st.error(f"Error making API request: {str(e)}")
-        return None
-    except json.JSONDecodeError as e:
-        st.error(f"Error parsing JSON response: {str(e)}")
-        return None
+        error = f"Error making API request: {str(e)}"
+    except orjson.JSONDecodeError as e:
+        error = f"Error parsing JSON response: {str(e)}"
     except KeyError as e:
-        st.error(f"Expected 'companies' key not found in API response: {str(e)}")
-        return None
+        error = f"Expected 'companies' key not found in API response: {str(e)}"
     except Exception as e:
-        st.error(f"Unexpected error loading data from API: {str(e)}")
+        error = f"Unexpected error loading data from API: {str(e)}"
+    return _load_cached_payload(), error
+
+def load_companies(api_url):
+    """Load prepared company data, serving the last saved payload if the API fails"""
+    prepared, error = _load_prepared_or_fallback(api_url)
+    if error is None:
+        return prepared
+    
+    if prepared is not None:
+        st.warning(f"Serving cached data - {error}")
+        return prepared
+    
+    st.error(error)
+    return None, None
+
+def _load_cached_payload():
+    """Load and prepare the last successful API payload from disk, if there is one"""
+    try:
+        return _prepare_companies(_companies_to_df(PAYLOAD_CACHE_PATH.read_bytes()))
+    except Exception:
+        # Best effort only; an unreadable copy just means there is no fallback
         return None
 
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES)
+def count_values(values):
+    """Value counts for a categorical column, without unused categories"""
+    counts = values.value_counts()
+    return counts[counts > 0]
+
+# Cached chart builders - reruns with unchanged data skip figure construction.
+# Plotly is imported inside each builder so pages that never chart skip the import.
+# Entries are capped because every distinct filter selection adds one.
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES)
+def build_funding_bar(df, title):
+    """Bar chart of total funding per company"""
+    import plotly.express as px
+    
+    fig = px.bar(
+        df, 
+        x='name', 
+        y='funding.amount',
+        title=title,
+        labels={'funding.amount': 'Funding (USD)', 'name': 'Company'}
+    )
+    fig.update_layout(height=400, xaxis_tickangle=45)
+    return fig
+
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES)
+def build_scatter(df):
+    """Scatter of employees vs commercial output, sized by funding"""
+    import plotly.express as px
+    
+    fig = px.scatter(
+        df, 
+        x='employees', 
+        y='commercial_output.mwe',
+        size='funding.amount',
+        hover_name='name',
+        title="Employees vs Planned Output (bubble size = funding)",
+        labels={
+            'employees': 'Number of Employees',
+            'commercial_output.mwe': 'Commercial Output (MWe)'
+        },
+        render_mode='webgl'  # WebGL stays responsive as the company list grows
+    )
+    fig.update_layout(height=400)
+    return fig
+
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES)
+def build_approach_pie(approach_counts):
+    """Pie chart of companies per fusion approach"""
+    import plotly.express as px
+    
+    fig = px.pie(
+        values=approach_counts.values, 
+        names=approach_counts.index,
+        title="Distribution of Fusion Approaches"
+    )
+    fig.update_layout(height=400, showlegend=True)
+    return fig
+
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES)
+def build_fuel_bar(fuel_counts):
+    """Bar chart of companies per fuel source"""
+    import plotly.express as px
+    
+    return px.bar(
+        x=fuel_counts.index,
+        y=fuel_counts.values,
+        title="Fuel Source Distribution",
+        labels={'x': 'Fuel Source', 'y': 'Number of Companies'}
+    )
+
 def main():
+    # Load data from API automatically on app startup
+    api_url = "https://t3zwgehlujggonby.anvil.app/W643GQARK3IPDHVYLUUODAVX/_/api/file/fusion_companies_json"
+    
+    # Start the request in the background while the page header renders
+    _start_prefetch(api_url)
+    
     # App title and header
     st.title("Fusion Companies Dashboard")
     st.markdown("*Comprehensive overview of fusion energy companies worldwide*")
     
-    # Load data from API automatically on app startup
-    api_url = "https://t3zwgehlujggonby.anvil.app/W643GQARK3IPDHVYLUUODAVX/_/api/file/fusion_companies_json"
-    
     with st.spinner("Loading fusion companies data..."):
-        df = load_data_from_api(api_url)
+        df, meta = load_companies(api_url)
     
     if df is None or df.empty:
         st.error("Failed to load data from API. Please refresh the page to try again.")
@@ -60,7 +308,7 @@ def main():
     st.sidebar.header("Filters")
     
     # Fuel source filter
-    available_fuel_sources = df['fuel_source'].unique().tolist()
+    available_fuel_sources = meta['fuel_sources']
     selected_fuel_sources = st.sidebar.multiselect(
         "Fuel Source:",
         options=available_fuel_sources,
@@ -68,51 +316,69 @@ def main():
     )
     
     # General approach filter
-    available_approaches = df['general_approach'].unique().tolist()
+    available_approaches = meta['approaches']
     selected_approaches = st.sidebar.multiselect(
         "General Approach:",
         options=available_approaches,
         default=available_approaches
     )
     
-    # Apply filters
-    filtered_df = df[
-        (df['fuel_source'].isin(selected_fuel_sources)) &
-        (df['general_approach'].isin(selected_approaches))
-    ]
+    # Apply filters - the default select-all state needs no masking at all
+    if (len(selected_fuel_sources) == len(available_fuel_sources) and
+            len(selected_approaches) == len(available_approaches)):
+        filtered_df = df
+    else:
+        # Compare integer category codes rather than labels
+        fuel_codes = df['fuel_source'].cat.categories.get_indexer(selected_fuel_sources)
+        approach_codes = df['general_approach'].cat.categories.get_indexer(selected_approaches)
+        mask = (
+            np.isin(df['fuel_source'].cat.codes.to_numpy(), fuel_codes) &
+            np.isin(df['general_approach'].cat.codes.to_numpy(), approach_codes)
+        )
+        filtered_df = df.loc[mask]
     
     # Main dashboard content - use filtered data
+    n_filtered = len(filtered_df)
+    is_empty = n_filtered == 0
+    
+    # Compute all KPI aggregates in a single pass
+    stats = filtered_df.agg({
+        'funding.amount': 'sum',
+        'employees': 'mean',
+        'commercial_output.mwe': 'mean'
+    }) if not is_empty else None
+    
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Total Companies", len(filtered_df))
+        st.metric("Total Companies", n_filtered)
     
     with col2:
-        if not filtered_df.empty:
-            total_funding = filtered_df['funding.amount'].sum() / 1e9  # Convert to billions
+        if stats is not None:
+            total_funding = stats['funding.amount'] / 1e9  # Convert to billions
             st.metric("Total Funding", f"${total_funding:.1f}B")
         else:
             st.metric("Total Funding", "$0B")
     
     with col3:
-        if not filtered_df.empty:
-            avg_employees = int(filtered_df['employees'].mean())
+        if stats is not None:
+            avg_employees = int(stats['employees'])
             st.metric("Avg Employees", f"{avg_employees}")
         else:
             st.metric("Avg Employees", "0")
     
     with col4:
-        if not filtered_df.empty:
-            avg_output = int(filtered_df['commercial_output.mwe'].mean())
+        if stats is not None:
+            avg_output = int(stats['commercial_output.mwe'])
             st.metric("Avg Output", f"{avg_output} MWe")
         else:
             st.metric("Avg Output", "0 MWe")
     
     # Show filter status
-    if len(filtered_df) < len(df):
-        st.info(f"Showing {len(filtered_df)} of {len(df)} companies based on current filters.")
+    if n_filtered < len(df):
+        st.info(f"Showing {n_filtered} of {len(df)} companies based on current filters.")
     
-    if filtered_df.empty:
+    if is_empty:
         st.warning("No companies match the selected filters. Please adjust your filter selections.")
         return
     
@@ -129,14 +395,14 @@ def main():
         )
         
         if selected_company:
-            company_data = filtered_df[filtered_df['name'] == selected_company].iloc[0]
+            company_data = filtered_df.loc[[selected_company]].iloc[0]
             
             col1, col2 = st.columns([2, 1])
             
             with col1:
                 st.write(f"**Description:** {company_data['description']}")
                 st.write(f"**Location:** {company_data['location']}")
-                st.write(f"**Founded:** {company_data['year_founded'][:4]}")
+                st.write(f"**Founded:** {company_data['founded_year']}")
                 st.write(f"**Employees:** {company_data['employees']:,}")
                 st.write(f"**Fusion Approach:** {company_data['general_approach']} - {company_data['specific_approach']}")
                 st.write(f"**Fuel Source:** {company_data['fuel_source']}")
@@ -149,12 +415,7 @@ def main():
                 
                 # Recent milestones
                 st.write("**Recent Milestones:**")
-                if isinstance(company_data['milestones_past_12_months'], str):
-                    milestones = eval(company_data['milestones_past_12_months'])
-                else:
-                    milestones = company_data['milestones_past_12_months']
-                
-                for milestone in milestones:
+                for milestone in company_data['milestones_past_12_months']:
                     st.write(f"• {milestone}")
     
     with tab2:
@@ -165,54 +426,31 @@ def main():
         
         with col1:
             st.write("**Funding Distribution by Company**")
-            funding_chart = px.bar(
-                filtered_df, 
-                x='name', 
-                y='funding.amount',
-                title="Total Funding by Company",
-                labels={'funding.amount': 'Funding (USD)', 'name': 'Company'}
-            )
-            funding_chart.update_xaxes(tickangle=45)
-            funding_chart.update_layout(height=400)
-            st.plotly_chart(funding_chart, width='stretch')
+            top_funded = filtered_df.nlargest(FUNDING_CHART_TOP_N, 'funding.amount')
+            if n_filtered > FUNDING_CHART_TOP_N:
+                funding_title = f"Top {FUNDING_CHART_TOP_N} Companies by Funding"
+            else:
+                funding_title = "Total Funding by Company"
+            funding_chart = build_funding_bar(top_funded[['name', 'funding.amount']], funding_title)
+            st.plotly_chart(funding_chart, key='funding_chart', width='stretch')
         
         with col2:
             st.write("**Employee Count vs Commercial Output**")
-            scatter_chart = px.scatter(
-                filtered_df, 
-                x='employees', 
-                y='commercial_output.mwe',
-                size='funding.amount',
-                hover_name='name',
-                title="Employees vs Planned Output (bubble size = funding)",
-                labels={
-                    'employees': 'Number of Employees',
-                    'commercial_output.mwe': 'Commercial Output (MWe)'
-                }
+            scatter_chart = build_scatter(
+                filtered_df[['name', 'employees', 'commercial_output.mwe', 'funding.amount']]
             )
-            scatter_chart.update_layout(height=400)
-            st.plotly_chart(scatter_chart, width='stretch')
+            st.plotly_chart(scatter_chart, key='scatter_chart', width='stretch')
         
         # Approach distribution
         st.write("**Fusion Approaches**")
-        approach_counts = filtered_df['general_approach'].value_counts()
-        pie_chart = px.pie(
-            values=approach_counts.values, 
-            names=approach_counts.index,
-            title="Distribution of Fusion Approaches"
-        )
-        pie_chart.update_layout(height=400, showlegend=True)
-        st.plotly_chart(pie_chart, width='stretch')
+        approach_counts = count_values(filtered_df['general_approach'])
+        pie_chart = build_approach_pie(approach_counts)
+        st.plotly_chart(pie_chart, key='pie_chart', width='stretch')
         
         st.write("**Fuel Sources**")
-        fuel_counts = filtered_df['fuel_source'].value_counts()
-        fuel_chart = px.bar(
-            x=fuel_counts.index,
-            y=fuel_counts.values,
-            title="Fuel Source Distribution",
-            labels={'x': 'Fuel Source', 'y': 'Number of Companies'}
-        )
-        st.plotly_chart(fuel_chart, width='stretch')
+        fuel_counts = count_values(filtered_df['fuel_source'])
+        fuel_chart = build_fuel_bar(fuel_counts)
+        st.plotly_chart(fuel_chart, key='fuel_chart', width='stretch')
     
     with tab3:
         st.subheader("Complete Company Database")
@@ -227,21 +465,24 @@ def main():
             min_funding = st.number_input(
                 "Minimum funding (millions USD)",
                 min_value=0,
-                max_value=int(filtered_df['funding.amount'].max() / 1e6) if not filtered_df.empty else 0,
+                max_value=int(filtered_df['funding.amount'].max() / 1e6) if not is_empty else 0,
                 value=0
             )
         
-        # Apply additional search filters
-        final_df = filtered_df.copy()
+        # Apply additional search filters as one combined mask
+        mask = np.ones(n_filtered, dtype=bool)
         
         if search_term:
-            final_df = final_df[
-                final_df['name'].str.contains(search_term, case=False) |
-                final_df['description'].str.contains(search_term, case=False)
-            ]
+            query = search_term.lower()
+            mask &= (
+                filtered_df['_name_lc'].str.contains(query, regex=False) |
+                filtered_df['_desc_lc'].str.contains(query, regex=False)
+            ).to_numpy()
         
         if min_funding > 0:
-            final_df = final_df[final_df['funding.amount'] >= min_funding * 1e6]
+            mask &= filtered_df['funding.amount'].to_numpy() >= min_funding * 1e6
+        
+        final_df = filtered_df.loc[mask]
         
         # Display filtered results
         st.write(f"**Showing {len(final_df)} companies**")
@@ -251,23 +492,18 @@ def main():
         else:
             # Select columns to display
             display_columns = [
-                'name', 'location', 'year_founded', 'employees', 
-                'funding.amount', 'general_approach', 'specific_approach',
+                'name', 'location', 'founded_display', 'employees', 
+                'funding_display', 'general_approach', 'specific_approach',
                 'fuel_source', 'commercial_output.mwe', 'pilot_plant_timeline'
             ]
             
-            # Format the dataframe for better display
-            display_df = final_df[display_columns].copy()
-            display_df['funding.amount'] = display_df['funding.amount'].apply(lambda x: f"${x/1e6:.1f}M")
-            display_df['year_founded'] = display_df['year_founded'].apply(lambda x: x[:4])
-            
             # Rename columns for better readability
-            display_df = display_df.rename(columns={
+            display_df = final_df[display_columns].rename(columns={
                 'name': 'Company',
                 'location': 'Location',
-                'year_founded': 'Founded',
+                'founded_display': 'Founded',
                 'employees': 'Employees',
-                'funding.amount': 'Funding',
+                'funding_display': 'Funding',
                 'general_approach': 'General Approach',
                 'specific_approach': 'Specific Approach',
                 'fuel_source': 'Fuel Source',
@@ -275,7 +511,12 @@ def main():
                 'pilot_plant_timeline': 'Pilot Timeline'
             })
             
-            st.dataframe(display_df, width='stretch', height=400)
+            # Only send the first rows to the browser unless asked for everything
+            if len(display_df) > TABLE_TOP_N and not st.checkbox("Show all companies", key='show_all_companies'):
+                st.caption(f"Showing first {TABLE_TOP_N} of {len(display_df)} companies")
+                display_df = display_df.head(TABLE_TOP_N)
+            
+            st.dataframe(display_df, width='stretch', height=400, hide_index=True)
 
 if __name__ == "__main__":
     main()